@@ -33,6 +33,7 @@ Options:
     --config PATH         Path to config file
     --log-file PATH       Path to log file
     --verbose            Enable verbose logging
+    --max-concurrency N  Max flows requesting at once (0 = unbounded)
     --cleanup           Clean up clients after test
 
 Example:
@@ -1,20 +1,49 @@
-import json
+import asyncio
 import uuid
 from typing import Dict, List, Optional
 import aiohttp
+import orjson
+from yarl import URL
 from .utils.config import ClientConfig
+from .utils.http import get_session, read_error_text
 # from .utils.logger import logger # Removed global logger import
 
+# create_client() posts a pre-serialised body, so aiohttp cannot infer its type
+_JSON_HEADERS = {
+    "Accept": "application/json",
+    "Content-Type": "application/json"
+}
+
 class ClientManager:
     """Manages Hydra OAuth2 clients"""
 
-    def __init__(self, admin_url: str, config: ClientConfig, logger, timeout: int = 10): # Added timeout param
-        self.admin_url = f"{admin_url.rstrip('/')}/admin"  # Add /admin to base URL
+    # Upper bound on admin requests in flight while creating clients in bulk
+    MAX_CONCURRENT_CREATES = 10
+
+    def __init__(
+        self,
+        admin_url: str,
+        config: ClientConfig,
+        logger,
+        timeout: int = 10,
+        session: Optional[aiohttp.ClientSession] = None
+    ):
+        self.admin_url = URL(admin_url) / "admin"  # Add /admin to base URL
         self.config = config
         self.logger = logger # Store logger instance
         self.timeout = aiohttp.ClientTimeout(total=timeout) # Create timeout object
         self.clients: Dict[str, dict] = {}
         self.clients_file = "output/clients.json"
+        # Endpoints are fixed per instance; pre-parsed URLs skip aiohttp's per-call parsing
+        self._clients_url = self.admin_url / "clients"
+        # Reuse one session (and its connection pool) for every admin call
+        self._session = session
+
+    async def _ensure_session(self) -> aiohttp.ClientSession:
+        """Return the injected session, falling back to the process-wide one"""
+        if self._session is None:
+            self._session = await get_session(self.timeout)
+        return self._session
 
     async def create_client(self) -> dict:
         """Create a new Hydra client with configuration"""
@@ -25,76 +54,101 @@ class ClientManager:
             **self.config.model_dump()
         }
 
-        async with aiohttp.ClientSession(timeout=self.timeout) as session: # Apply timeout
-            async with session.post(
-                f"{self.admin_url}/clients",
-                json=client_data
-            ) as response:
-                if response.status != 201:
-                    error_text = await response.text()
-                    self.logger.error(f"Failed to create client: {error_text}") # Use self.logger
-                    raise Exception(f"Failed to create client: {error_text}")
-                
-                created_client = await response.json()
-                self.clients[client_id] = created_client
-                self.logger.success(f"Created client: {client_id}") # Use self.logger
-                return created_client
+        session = await self._ensure_session()
+        async with session.post(
+            self._clients_url,
+            data=orjson.dumps(client_data),
+            headers=_JSON_HEADERS
+        ) as response:
+            if response.status != 201:
+                error_text = await read_error_text(response)
+                # Logged by create_clients() together with transport errors
+                raise Exception(f"Failed to create client: {error_text}")
+            
+            created_client = orjson.loads(await response.read())
+            self.clients[client_id] = created_client
+            self.logger.debug("Created client: %s", client_id)
+            return created_client
 
     async def get_client(self, client_id: str) -> Optional[dict]:
         """Get client details by ID"""
-        async with aiohttp.ClientSession(timeout=self.timeout) as session: # Apply timeout
-            async with session.get(
-                f"{self.admin_url}/clients/{client_id}"
-            ) as response:
-                if response.status == 404:
-                    return None
-                if response.status != 200:
-                    error_text = await response.text()
-                    self.logger.error(f"Failed to get client {client_id}: {error_text}") # Use self.logger
-                    raise Exception(f"Failed to get client {client_id}: {error_text}")
-                
-                client = await response.json()
-                return client
+        session = await self._ensure_session()
+        async with session.get(
+            self._clients_url / client_id
+        ) as response:
+            if response.status == 404:
+                return None
+            if response.status != 200:
+                error_text = await read_error_text(response)
+                self.logger.error(f"Failed to get client {client_id}: {error_text}") # Use self.logger
+                raise Exception(f"Failed to get client {client_id}: {error_text}")
+            
+            client = orjson.loads(await response.read())
+            return client
 
     async def delete_client(self, client_id: str) -> bool:
         """Delete a client by ID"""
-        async with aiohttp.ClientSession(timeout=self.timeout) as session: # Apply timeout
-            async with session.delete(
-                f"{self.admin_url}/clients/{client_id}"
-            ) as response:
-                if response.status not in [204, 404]:
-                    error_text = await response.text()
-                    self.logger.error(f"Failed to delete client {client_id}: {error_text}") # Use self.logger
-                    raise Exception(f"Failed to delete client {client_id}: {error_text}")
-                
-                if response.status == 204:
-                    self.clients.pop(client_id, None)
-                    self.logger.info(f"Deleted client: {client_id}") # Use self.logger
-                    return True
-                return False
+        session = await self._ensure_session()
+        async with session.delete(
+            self._clients_url / client_id
+        ) as response:
+            if response.status not in [204, 404]:
+                error_text = await read_error_text(response)
+                self.logger.error(f"Failed to delete client {client_id}: {error_text}") # Use self.logger
+                raise Exception(f"Failed to delete client {client_id}: {error_text}")
+            
+            if response.status == 204:
+                self.clients.pop(client_id, None)
+                self.logger.info(f"Deleted client: {client_id}") # Use self.logger
+                return True
+            return False
 
     async def create_clients(self, count: int) -> List[dict]:
-        """Create multiple clients"""
-        clients = []
-        for _ in range(count):
-            client = await self.create_client()
-            clients.append(client)
+        """Create multiple clients concurrently"""
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_CREATES)
+
+        async def _create() -> dict:
+            async with semaphore:
+                return await self.create_client()
+
+        # Let every create finish before deciding, so none is left in flight
+        results = await asyncio.gather(*(_create() for _ in range(count)), return_exceptions=True)
+        clients = [r for r in results if not isinstance(r, BaseException)]
+        failures = [r for r in results if isinstance(r, BaseException)]
+        if failures:
+            # Covers both error responses and transport errors (connection
+            # refused, timeouts), which create_client() raises without logging
+            for exc in failures:
+                self.logger.error("Client creation failed: %s: %s", type(exc).__name__, exc)
+            self.logger.warning(f"Created {len(clients)}/{count} clients, {len(failures)} failed")
+            raise failures[0]
+        # One summary line instead of a log record per client
+        self.logger.success(f"Created {count} clients")
         return clients
 
-    def save_clients(self) -> None:
-        """Save client data to file"""
-        with open(self.clients_file, 'w') as f:
-            json.dump(self.clients, f, indent=4)
+    async def save_clients(self) -> None:
+        """Save client data to file without blocking the event loop"""
+        data = orjson.dumps(self.clients, option=orjson.OPT_INDENT_2)
+        await asyncio.to_thread(self._write_file, data)
         self.logger.info(f"Saved {len(self.clients)} clients to {self.clients_file}") # Use self.logger
 
-    def load_clients(self) -> Dict[str, dict]:
-        """Load client data from file"""
+    async def load_clients(self) -> Dict[str, dict]:
+        """Load client data from file without blocking the event loop"""
         try:
-            with open(self.clients_file, 'r') as f:
-                self.clients = json.load(f)
+            self.clients = orjson.loads(await asyncio.to_thread(self._read_file))
             self.logger.info(f"Loaded {len(self.clients)} clients from {self.clients_file}") # Use self.logger
         except FileNotFoundError:
             self.logger.warning(f"No clients file found at {self.clients_file}") # Use self.logger
         return self.clients
 
+    def _write_file(self, data: bytes) -> None:
+        """Blocking write of the clients file; run off the event loop"""
+        with open(self.clients_file, 'wb') as f:
+            f.write(data)
+
+    def _read_file(self) -> bytes:
+        """Blocking read of the clients file; run off the event loop"""
+        with open(self.clients_file, 'rb') as f:
+            return f.read()
+
     # Removed cleanup_clients method
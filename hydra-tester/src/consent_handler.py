@@ -1,43 +1,61 @@
+import re
 import aiohttp
+import orjson
+from yarl import URL
 from typing import Dict, Any, Optional, Tuple, List
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import unquote
+from .utils.http import get_session
 # from .utils.logger import logger # Removed global logger import
 
+# Precompiled per challenge type so extraction is a single scan of the redirect URL
+_CHALLENGE_PATTERNS = {
+    challenge_type: re.compile(rf"[?&]{challenge_type}_challenge=([^&#]+)")
+    for challenge_type in ("login", "consent")
+}
+
 class ConsentHandler:
     """Handles Hydra login and consent flows"""
 
     # Assuming ConsentHandler doesn't need its own logger instance for now,
     # as errors are typically logged by the calling function (OAuthFlow).
-    def __init__(self, admin_url: str, subject: str, session_data: Dict[str, Any], timeout: int = 10): # Added timeout
-        self.admin_url = f"{admin_url.rstrip('/')}/admin"  # Add /admin to base URL
+    def __init__(
+        self,
+        admin_url: str,
+        subject: str,
+        session_data: Dict[str, Any],
+        timeout: int = 10,
+        session: Optional[aiohttp.ClientSession] = None
+    ):
+        self.admin_url = URL(admin_url) / "admin"  # Add /admin to base URL
         self.subject = subject
         self.session_data = session_data
         self.timeout = aiohttp.ClientTimeout(total=timeout) # Create timeout object
+        # Endpoints are fixed per instance; pre-parsed URLs skip aiohttp's per-call parsing
+        requests_url = self.admin_url / "oauth2" / "auth" / "requests"
+        self._login_accept_url = requests_url / "login" / "accept"
+        self._consent_accept_url = requests_url / "consent" / "accept"
+        # Reuse one session (and its connection pool) for every admin call
+        self._session = session
+
+    async def _ensure_session(self) -> aiohttp.ClientSession:
+        """Return the injected session, falling back to the process-wide one"""
+        if self._session is None:
+            self._session = await get_session(self.timeout)
+        return self._session
 
     @staticmethod
     def extract_challenge(url: str, challenge_type: str) -> Optional[str]:
         """Extract login or consent challenge from URL"""
-        try:
-            parsed = urlparse(url)
-            params = parse_qs(parsed.query)
-            challenge = params.get(f"{challenge_type}_challenge", [None])[0]
-            return challenge
-        except Exception as e:
-            # Log errors from the calling context (OAuthFlow) which has the logger
-            print(f"Error extracting {challenge_type} challenge: {e}") # Basic print for now
-            return None
+        match = _CHALLENGE_PATTERNS[challenge_type].search(url)
+        return unquote(match.group(1)) if match else None
 
     async def handle_login_challenge(self, challenge: str) -> Dict[str, Any]:
         """Handle the login challenge"""
         if not challenge:
             raise ValueError("No login challenge provided")
 
-        # Get login request
-        login_request = await self._get_login_request(challenge)
-        if not login_request:
-            raise Exception("Failed to get login request")
-
-        # Accept login
+        # Accept login directly; the accept call validates the challenge, so a
+        # preceding GET of the login request would only add a round trip
         accept_response = await self._accept_login(challenge)
         if not accept_response or "redirect_to" not in accept_response:
             raise Exception("Failed to accept login")
@@ -49,12 +67,7 @@ class ConsentHandler:
         if not challenge:
             raise ValueError("No consent challenge provided")
 
-        # Get consent request
-        consent_request = await self._get_consent_request(challenge)
-        if not consent_request:
-            raise Exception("Failed to get consent request")
-
-        # Accept consent
+        # Accept consent directly; see handle_login_challenge
         accept_response = await self._accept_consent(
             challenge,
             requested_scopes
@@ -64,18 +77,6 @@ class ConsentHandler:
 
         return accept_response
 
-    async def _get_login_request(self, challenge: str) -> Optional[dict]:
-        """Get login request details"""
-        async with aiohttp.ClientSession(timeout=self.timeout) as session: # Apply timeout
-            async with session.get(
-                f"{self.admin_url}/oauth2/auth/requests/login",
-                params={"login_challenge": challenge}
-            ) as response:
-                if response.status != 200:
-                    # Error should be logged by the caller
-                    return None
-                return await response.json()
-
     async def _accept_login(
         self,
         challenge: str,
@@ -89,28 +90,18 @@ class ConsentHandler:
             "remember_for": remember_for
         }
 
-        async with aiohttp.ClientSession(timeout=self.timeout) as session: # Apply timeout
-            async with session.put(
-                f"{self.admin_url}/oauth2/auth/requests/login/accept",
-                params={"login_challenge": challenge},
-                json=data
-            ) as response:
-                if response.status != 200:
-                    # Error should be logged by the caller
-                    return None
-                return await response.json()
-
-    async def _get_consent_request(self, challenge: str) -> Optional[dict]:
-        """Get consent request details"""
-        async with aiohttp.ClientSession(timeout=self.timeout) as session: # Apply timeout
-            async with session.get(
-                f"{self.admin_url}/oauth2/auth/requests/consent",
-                params={"consent_challenge": challenge}
-            ) as response:
-                if response.status != 200:
-                    # Error should be logged by the caller
-                    return None
-                return await response.json()
+        session = await self._ensure_session()
+        async with session.put(
+            self._login_accept_url,
+            params={"login_challenge": challenge},
+            json=data
+        ) as response:
+            if response.status != 200:
+                # Error should be logged by the caller
+                return None
+            body = await response.read()
+        # Parse after the block exits so the connection is back in the pool
+        return orjson.loads(body)
 
     async def _accept_consent(
         self,
@@ -125,13 +116,14 @@ class ConsentHandler:
             "session": self.session_data
         }
 
-        async with aiohttp.ClientSession(timeout=self.timeout) as session: # Apply timeout
-            async with session.put(
-                f"{self.admin_url}/oauth2/auth/requests/consent/accept",
-                params={"consent_challenge": challenge},
-                json=data
-            ) as response:
-                if response.status != 200:
-                    # Error should be logged by the caller
-                    return None
-                return await response.json()
+        session = await self._ensure_session()
+        async with session.put(
+            self._consent_accept_url,
+            params={"consent_challenge": challenge},
+            json=data
+        ) as response:
+            if response.status != 200:
+                # Error should be logged by the caller
+                return None
+            body = await response.read()
+        return orjson.loads(body)
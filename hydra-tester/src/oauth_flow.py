@@ -1,14 +1,21 @@
-import json
+import logging
 import time
 import asyncio
-import threading
-from typing import Dict, Optional, Tuple
+from contextlib import nullcontext
+from typing import Dict, List, Optional
 import aiohttp
-from urllib.parse import urlencode, urlparse, parse_qs
+import orjson
+from urllib.parse import urlencode, quote_plus, unquote
+from yarl import URL
 from .utils.pkce import PKCEGenerator
+from .utils.http import get_session, read_error_text
+from .utils.logger import PrefixedLogger
 # from .utils.logger import logger # Removed global logger import
 from .consent_handler import ConsentHandler
 
+# Token endpoint bodies are pre-encoded bytes, so the form type is set explicitly
+_FORM_HEADERS = {'Content-Type': 'application/x-www-form-urlencoded'}
+
 class OAuthFlow:
     """Handles OAuth2 authorization code flow with PKCE"""
 
@@ -25,7 +32,9 @@ class OAuthFlow:
         session_data: Dict,
         thread_id: Optional[int] = None,
         logger = None, # Added logger parameter
-        timeout: int = 10 # Added timeout parameter
+        timeout: int = 10, # Added timeout parameter
+        session: Optional[aiohttp.ClientSession] = None,
+        limiter: Optional[asyncio.Semaphore] = None
     ):
         self.auth_url = auth_url.rstrip('/')
         self.token_url = token_url.rstrip('/')
@@ -35,10 +44,43 @@ class OAuthFlow:
         self.redirect_uri = redirect_uri
         self.scope = scope
         self.pkce = PKCEGenerator()
+        # Endpoint URLs and the PKCE-independent part of the authorization
+        # query are fixed for the flow's lifetime
+        self._token_endpoint = f"{self.token_url}/oauth2/token"
+        self._auth_url_prefix = f"{self.auth_url}/oauth2/auth?" + urlencode({
+            "response_type": "code",
+            "client_id": client_id,
+            "redirect_uri": redirect_uri,
+            "scope": scope
+        })
+        self._initial_auth_url = self._build_initial_auth_url()
         self.logger = logger # Store logger instance
         self.timeout = aiohttp.ClientTimeout(total=timeout) # Create timeout object
-        # Pass timeout to ConsentHandler
-        self.consent_handler = ConsentHandler(admin_url, subject, session_data, timeout=timeout) 
+        # Pass timeout and the shared admin session to ConsentHandler
+        self.consent_handler = ConsentHandler(admin_url, subject, session_data, timeout=timeout, session=session)
+        # Reuse one session (and its connection pool) for every public call
+        self._session = session
+        # This flow's Hydra cookies (CSRF etc.). The shared session uses a dummy
+        # jar so concurrent flows can't see each other's cookies; this dict
+        # plays the jar's role and is updated in place on every redirect hop
+        self._cookies: Dict[str, str] = {}
+        # Shared cap on flows talking to Hydra at once; held per refresh
+        # request so refresh sleeps don't occupy a slot
+        self._limiter = limiter if limiter is not None else nullcontext()
+        # Constant part of every refresh body; only the refresh token varies
+        self._refresh_prefix = urlencode({
+            "grant_type": "refresh_token",
+            "client_id": client_id,
+            "client_secret": client_secret
+        }).encode() + b"&refresh_token="
+        # Likewise for the code exchange, where only code and verifier vary.
+        # Joined rather than %-formatted: the encoded redirect_uri contains '%'
+        self._exchange_prefix = urlencode({
+            "grant_type": "authorization_code",
+            "client_id": client_id,
+            "client_secret": client_secret,
+            "redirect_uri": self.redirect_uri
+        }).encode() + b"&code="
         
         # Thread-specific token file
         if thread_id is not None:
@@ -46,148 +88,176 @@ class OAuthFlow:
         else:
             self.tokens_file = "output/tokens.json"
             
-        # Thread-local storage for session data
-        self.thread_local = threading.local()
-        self.thread_local.token_history = []
+        # Token events for this flow; it runs as a single task on the event
+        # loop, so a plain list needs no thread-local storage
+        self.token_history: List[dict] = []
         self.thread_id = thread_id
+        # Prefix every message with this flow's identity; formatted once here
+        # rather than in each log call
+        if logger is not None:
+            self.logger = PrefixedLogger(logger, f"[Client {client_id} Thread {thread_id}]")
+
+    def reset_pkce(self) -> None:
+        """Generate fresh PKCE verifier, state and nonce for another flow run"""
+        self.pkce = PKCEGenerator()
+        self._initial_auth_url = self._build_initial_auth_url()
 
-    async def _make_auth_request(self, url: Optional[str] = None, cookies: Optional[Dict] = None) -> Tuple[str, Dict]:
-        """Make authorization request with cookie handling"""
+    def _build_initial_auth_url(self) -> URL:
+        """Build the authorization URL for the current PKCE parameters"""
+        pkce = self.pkce
+        # PKCE values are base64url, so they need no quoting; the whole URL is
+        # already percent-encoded and yarl can skip re-quoting it
+        return URL(
+            f"{self._auth_url_prefix}&code_challenge={pkce.code_challenge}"
+            f"&code_challenge_method=S256&state={pkce.state}&nonce={pkce.nonce}",
+            encoded=True
+        )
+
+    async def _ensure_session(self) -> aiohttp.ClientSession:
+        """Return the injected session, falling back to the process-wide one"""
+        if self._session is None:
+            self._session = await get_session(self.timeout)
+        return self._session
+
+    async def _make_auth_request(self, url: Optional[str] = None) -> str:
+        """Make authorization request, sending and collecting this flow's cookies"""
         if not url:
             # Initial auth request
-            params = {
-                "response_type": "code",
-                "client_id": self.client_id,
-                "redirect_uri": self.redirect_uri,
-                "scope": self.scope,
-                **self.pkce.auth_params
-            }
-            url = f"{self.auth_url}/oauth2/auth?{urlencode(params)}"
-            self.logger.debug(f"[Client {self.client_id} Thread {self.thread_id}] Making initial auth request to: {url}") # Use self.logger
-
-        async with aiohttp.ClientSession(timeout=self.timeout) as session: # Apply timeout
-            async with session.get(url, allow_redirects=False, cookies=cookies) as response:
-                if response.status not in [302, 303]:
-                    error_text = await response.text()
-                    raise Exception(f"Expected redirect, got {response.status}: {error_text}")
-                
-                # Convert cookies to dict
-                new_cookies = {}
-                for cookie in response.cookies.values():
-                    new_cookies[cookie.key] = cookie.value
-                
-                return response.headers['Location'], new_cookies
+            url = self._initial_auth_url
+            self.logger.debug("Making initial auth request to: %s", url) # Use self.logger
+
+        session = await self._ensure_session()
+        async with session.get(url, allow_redirects=False, cookies=self._cookies) as response:
+            if response.status not in [302, 303]:
+                error_text = await read_error_text(response)
+                raise Exception(f"Expected redirect, got {response.status}: {error_text}")
+            
+            # Remember any cookies Hydra set for the following hops
+            cookies = self._cookies
+            for cookie in response.cookies.values():
+                cookies[cookie.key] = cookie.value
+
+            # Releasing a response with unread body bytes makes aiohttp close
+            # the connection. Hydra's redirect bodies are tiny and normally
+            # arrive with the headers; drain any stragglers to keep it pooled
+            if not response.content.is_eof():
+                await response.content.read()
+
+            return response.headers['Location']
 
     async def _exchange_code_for_tokens(self, code: str) -> dict:
         """Exchange authorization code for tokens"""
-        data = {
-            "grant_type": "authorization_code",
-            "client_id": self.client_id,
-            "client_secret": self.client_secret,
-            "code": code,
-            "redirect_uri": self.redirect_uri,
-            **self.pkce.token_params
-        }
-
-        async with aiohttp.ClientSession(timeout=self.timeout) as session: # Apply timeout
-            async with session.post(
-                f"{self.token_url}/oauth2/token",
-                data=data,
-                headers={'Content-Type': 'application/x-www-form-urlencoded'}
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"[Client {self.client_id} Thread {self.thread_id}] Token exchange failed: {error_text}")
-                return await response.json()
+        data = b"".join((
+            self._exchange_prefix,
+            quote_plus(code).encode(),
+            b"&code_verifier=",
+            quote_plus(self.pkce.code_verifier).encode()
+        ))
+
+        session = await self._ensure_session()
+        async with session.post(
+            self._token_endpoint,
+            data=data,
+            headers=_FORM_HEADERS
+        ) as response:
+            if response.status != 200:
+                error_text = await read_error_text(response)
+                raise Exception(f"[Client {self.client_id} Thread {self.thread_id}] Token exchange failed: {error_text}")
+            body = await response.read()
+        # Parse after the block exits so the connection is back in the pool
+        return orjson.loads(body)
 
     async def _refresh_token(self, refresh_token: str) -> dict:
         """Refresh access token using refresh token"""
-        data = {
-            "grant_type": "refresh_token",
-            "client_id": self.client_id,
-            "client_secret": self.client_secret,
-            "refresh_token": refresh_token
-        }
-
-        async with aiohttp.ClientSession(timeout=self.timeout) as session: # Apply timeout
-            async with session.post(
-                f"{self.token_url}/oauth2/token",
-                data=data,
-                headers={'Content-Type': 'application/x-www-form-urlencoded'}
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"[Client {self.client_id} Thread {self.thread_id}] Token refresh failed: {error_text}")
-                return await response.json()
+        data = self._refresh_prefix + quote_plus(refresh_token).encode()
+
+        session = await self._ensure_session()
+        async with session.post(
+            self._token_endpoint,
+            data=data,
+            headers=_FORM_HEADERS
+        ) as response:
+            if response.status != 200:
+                error_text = await read_error_text(response)
+                raise Exception(f"[Client {self.client_id} Thread {self.thread_id}] Token refresh failed: {error_text}")
+            body = await response.read()
+        return orjson.loads(body)
 
     async def run_auth_flow(self) -> dict:
         """Run complete OAuth2 authorization flow"""
         self.logger.section(f"Starting OAuth2 flow for client {self.client_id} thread {self.thread_id}") # Use self.logger
 
+        # Each run starts a fresh login session with Hydra
+        self._cookies.clear()
+
         # Step 1: Initial authorization request
-        redirect_url, cookies = await self._make_auth_request()
-        self.logger.debug(f"[Client {self.client_id} Thread {self.thread_id}] Auth URL used: {self.auth_url}") # Use self.logger
-        self.logger.debug(f"[Client {self.client_id} Thread {self.thread_id}] Initial redirect: {redirect_url}") # Use self.logger
+        redirect_url = await self._make_auth_request()
+        self.logger.debug("Auth URL used: %s", self.auth_url) # Use self.logger
+        self.logger.debug("Initial redirect: %s", redirect_url) # Use self.logger
 
         # Step 2: Handle login challenge
         login_challenge = self.consent_handler.extract_challenge(redirect_url, "login")
         if not login_challenge: # Check if challenge extraction failed
-             self.logger.error(f"[Client {self.client_id} Thread {self.thread_id}] Failed to extract login challenge from URL: {redirect_url}")
+             self.logger.error(f"Failed to extract login challenge from URL: {redirect_url}")
              raise Exception("Login challenge extraction failed")
         login_response = await self.consent_handler.handle_login_challenge(login_challenge)
         if not login_response: # Check if handler failed
-             self.logger.error(f"[Client {self.client_id} Thread {self.thread_id}] Login challenge handling failed for challenge: {login_challenge}")
+             self.logger.error(f"Login challenge handling failed for challenge: {login_challenge}")
              raise Exception("Login challenge handling failed")
         login_redirect = login_response["redirect_to"]
-        self.logger.debug(f"[Client {self.client_id} Thread {self.thread_id}] Login redirect: {login_redirect}") # Use self.logger
+        self.logger.debug("Login redirect: %s", login_redirect) # Use self.logger
 
         # Step 3: Make auth request with login verifier
-        consent_redirect, updated_cookies = await self._make_auth_request(
-            login_redirect,
-            cookies
-        )
-        self.logger.debug(f"[Client {self.client_id} Thread {self.thread_id}] Consent redirect: {consent_redirect}") # Use self.logger
-        self.logger.debug(f"[Client {self.client_id} Thread {self.thread_id}] Updated cookies: {updated_cookies}") # Use self.logger
+        consent_redirect = await self._make_auth_request(login_redirect)
+        self.logger.debug("Consent redirect: %s", consent_redirect) # Use self.logger
+        if self.logger.isEnabledFor(logging.DEBUG):
+            # Snapshot: the dict keeps changing after the record is queued
+            self.logger.debug("Cookies: %s", dict(self._cookies))
 
         # Step 4: Handle consent challenge
         consent_challenge = self.consent_handler.extract_challenge(consent_redirect, "consent")
         if not consent_challenge: # Check if challenge extraction failed
-             self.logger.error(f"[Client {self.client_id} Thread {self.thread_id}] Failed to extract consent challenge from URL: {consent_redirect}")
+             self.logger.error(f"Failed to extract consent challenge from URL: {consent_redirect}")
              raise Exception("Consent challenge extraction failed")
         consent_response = await self.consent_handler.handle_consent_challenge(
             consent_challenge,
             self.scope.split()
         )
         if not consent_response: # Check if handler failed
-             self.logger.error(f"[Client {self.client_id} Thread {self.thread_id}] Consent challenge handling failed for challenge: {consent_challenge}")
+             self.logger.error(f"Consent challenge handling failed for challenge: {consent_challenge}")
              raise Exception("Consent challenge handling failed")
         final_redirect = consent_response["redirect_to"]
-        self.logger.debug(f"[Client {self.client_id} Thread {self.thread_id}] Final redirect: {final_redirect}") # Use self.logger
+        self.logger.debug("Final redirect: %s", final_redirect) # Use self.logger
 
         # Step 5: Make final auth request with consent verifier to get code
-        callback_redirect, final_cookies = await self._make_auth_request(
-            final_redirect,
-            {**cookies, **updated_cookies}  # Merge all cookies
-        )
-        self.logger.debug(f"[Client {self.client_id} Thread {self.thread_id}] Callback redirect with code: {callback_redirect}") # Use self.logger
-        self.logger.debug(f"[Client {self.client_id} Thread {self.thread_id}] Final cookies: {final_cookies}") # Use self.logger
+        callback_redirect = await self._make_auth_request(final_redirect)
+        self.logger.debug("Callback redirect with code: %s", callback_redirect) # Use self.logger
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Final cookies: %s", dict(self._cookies))
 
-        # Extract authorization code from callback
-        parsed = urlparse(callback_redirect)
-        params = parse_qs(parsed.query)
-        code = params.get('code', [None])[0]
+        # Extract authorization code from callback; the URL is always
+        # "{redirect_uri}?code=...&scope=...&state=...", so skip full query parsing
+        code = None
+        if callback_redirect.startswith(self.redirect_uri):
+            _, sep, rest = callback_redirect.partition('?code=')
+            if not sep:
+                _, sep, rest = callback_redirect.partition('&code=')
+            if sep:
+                code = rest.partition('&')[0]
+                if '%' in code:
+                    code = unquote(code)
         if not code:
-            self.logger.error(f"[Client {self.client_id} Thread {self.thread_id}] Failed to extract code from redirect: {callback_redirect}") # Use self.logger
+            self.logger.error(f"Failed to extract code from redirect: {callback_redirect}") # Use self.logger
             raise Exception("No authorization code in redirect")
-        self.logger.debug(f"[Client {self.client_id} Thread {self.thread_id}] Extracted code: {code[:20]}...") # Use self.logger
+        self.logger.debug("Extracted code: %s...", code[:20]) # Use self.logger
 
         # Exchange code for tokens
         tokens = await self._exchange_code_for_tokens(code)
-        self.logger.success(f"[Client {self.client_id} Thread {self.thread_id}] Successfully obtained tokens") # Use self.logger
-        self.logger.debug(f"[Client {self.client_id} Thread {self.thread_id}] Tokens received: {tokens}") # Use self.logger
+        self.logger.success("Successfully obtained tokens") # Use self.logger
+        self.logger.debug("Tokens received: %s", tokens) # Use self.logger
 
-        # Save initial token set to thread-local storage
-        self.thread_local.token_history.append({
+        # Record the initial token set in this flow's history
+        self.token_history.append({
             "client_id": self.client_id,
             "thread_id": self.thread_id,
             "timestamp": time.time(),
@@ -208,22 +278,28 @@ class OAuthFlow:
 
         current_token = refresh_token
         if not current_token:
-             self.logger.warning(f"[Client {self.client_id} Thread {self.thread_id}] No refresh token provided to start refresh cycle.")
+             self.logger.warning("No refresh token provided to start refresh cycle.")
              return # Cannot proceed without a refresh token
 
+        # Refreshes are scheduled against fixed deadlines so request latency
+        # doesn't stretch the period and the load keeps its intended cadence
+        start = time.monotonic()
         for i in range(count):
-            self.logger.info(f"[Client {self.client_id} Thread {self.thread_id}] Refresh attempt {i+1}/{count}") # Use self.logger
+            self.logger.info("Refresh attempt %d/%d", i + 1, count) # Use self.logger
             
-            # Wait for interval
-            await asyncio.sleep(interval)
+            # Wait until this attempt's deadline
+            delay = start + (i + 1) * interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
 
             try:
                 # Refresh token
-                new_tokens = await self._refresh_token(current_token)
-                self.logger.success(f"[Client {self.client_id} Thread {self.thread_id}] Token refresh {i+1} successful") # Use self.logger
+                async with self._limiter:
+                    new_tokens = await self._refresh_token(current_token)
+                self.logger.success(f"Token refresh {i+1} successful") # Use self.logger
 
-                # Save to thread-local history
-                self.thread_local.token_history.append({
+                # Record in this flow's history
+                self.token_history.append({
                     "client_id": self.client_id,
                     "thread_id": self.thread_id,
                     "timestamp": time.time(),
@@ -237,15 +313,15 @@ class OAuthFlow:
                 current_token = new_tokens.get('refresh_token', current_token) 
 
             except Exception as e:
-                self.logger.error(f"[Client {self.client_id} Thread {self.thread_id}] Refresh attempt {i+1} failed: {e}") # Use self.logger
+                self.logger.error(f"Refresh attempt {i+1} failed: {e}") # Use self.logger
                 break
 
     def save_token_history(self) -> None:
         """Save token history to thread-specific file"""
         # Each thread writes to its own file, so no locking needed
         try:
-            with open(self.tokens_file, 'w') as f:
-                json.dump(self.thread_local.token_history, f, indent=4)
-            self.logger.info(f"[Client {self.client_id} Thread {self.thread_id}] Saved {len(self.thread_local.token_history)} token events to {self.tokens_file}") # Use self.logger
+            with open(self.tokens_file, 'wb') as f:
+                f.write(orjson.dumps(self.token_history, option=orjson.OPT_INDENT_2))
+            self.logger.info(f"Saved {len(self.token_history)} token events to {self.tokens_file}") # Use self.logger
         except Exception as e:
-            self.logger.error(f"[Client {self.client_id} Thread {self.thread_id}] Failed to save token history to {self.tokens_file}: {e}")
+            self.logger.error(f"Failed to save token history to {self.tokens_file}: {e}")
@@ -1,5 +1,5 @@
-import json
 import os
+import orjson
 from typing import Dict, Any, List
 from typing_extensions import Annotated
 from pydantic import BaseModel, Field
@@ -45,30 +45,25 @@ class ConfigLoader:
     def _load_config(self) -> Config:
         """Load configuration from file and override with environment variables"""
         try:
-            with open(self.config_path, 'r') as f:
-                config_data = json.load(f)
+            with open(self.config_path, 'rb') as f:
+                config_data = orjson.loads(f.read())
         except FileNotFoundError:
             config_data = {}
 
-        # Override with environment variables if present
-        env_overrides = {
-            "oauth_settings": {
-                "auth_url": os.getenv("HYDRA_PUBLIC_URL", "http://localhost:4444"),
-                "token_url": os.getenv("HYDRA_PUBLIC_URL", "http://localhost:4444"),
-                "admin_url": os.getenv("HYDRA_ADMIN_URL", "http://localhost:4445"),
-                "subject": os.getenv("TEST_SUBJECT", "test-user@example.com")
-            }
+        # Override with environment variables, but only those actually set
+        # (non-empty); file values and model defaults apply otherwise
+        public_url = os.getenv("HYDRA_PUBLIC_URL")
+        env_values = {
+            "auth_url": public_url,
+            "token_url": public_url,
+            "admin_url": os.getenv("HYDRA_ADMIN_URL"),
+            "subject": os.getenv("TEST_SUBJECT")
         }
+        overrides = {key: value for key, value in env_values.items() if value}
+        if overrides:
+            config_data.setdefault("oauth_settings", {}).update(overrides)
 
-        # Only update if environment variables are set (not empty)
-        for section, values in env_overrides.items():
-            if section not in config_data:
-                config_data[section] = {}
-            for key, value in values.items():
-                if value:  # Only override if environment variable is set
-                    config_data[section][key] = value
-
-        return Config(**config_data)
+        return Config.model_validate(config_data)
 
     def get_config(self) -> Config:
         """Get the loaded configuration"""
@@ -77,5 +72,5 @@ class ConfigLoader:
     def save_config(self, config_path: str = None) -> None:
         """Save the current configuration to a file"""
         save_path = config_path or self.config_path
-        with open(save_path, 'w') as f:
-            json.dump(self.config.model_dump(), f, indent=4)
+        with open(save_path, 'wb') as f:
+            f.write(orjson.dumps(self.config.model_dump(), option=orjson.OPT_INDENT_2))
@@ -0,0 +1,89 @@
+from typing import Optional
+import aiohttp
+import orjson
+
+# Only headers that apply to every request belong here; Content-Type comes
+# from the body (json=) or is passed per request for pre-encoded bodies.
+_DEFAULT_HEADERS = {
+    "User-Agent": "hydra-tester/1.0"
+}
+
+def _json_serialize(obj) -> str:
+    """orjson-backed serializer for aiohttp's json= request argument"""
+    return orjson.dumps(obj).decode()
+
+def _create_resolver() -> aiohttp.abc.AbstractResolver:
+    """Use the aiodns-backed resolver when installed, else the threaded default"""
+    try:
+        return aiohttp.AsyncResolver()
+    except RuntimeError:  # aiodns is not installed
+        return aiohttp.ThreadedResolver()
+
+async def create_session(timeout: aiohttp.ClientTimeout, limit: int = 0) -> aiohttp.ClientSession:
+    """
+    Create an HTTP session meant to be shared across many requests.
+    Must be awaited from inside the event loop that will use the session.
+    Args:
+        timeout: Default timeout applied to every request made with the session
+        limit: Maximum number of open connections (0 means unlimited)
+    Returns:
+        A ClientSession backed by a keep-alive connection pool
+    """
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=0,  # Only two Hydra hosts; skip per-host bookkeeping
+        keepalive_timeout=120,
+        resolver=_create_resolver(),
+        use_dns_cache=True,
+        ttl_dns_cache=600
+    )
+    # Cookies are passed explicitly per OAuth flow; a shared jar would leak
+    # Hydra's CSRF cookies between concurrent flows.
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=timeout,
+        headers=_DEFAULT_HEADERS,
+        cookie_jar=aiohttp.DummyCookieJar(),
+        json_serialize=_json_serialize
+    )
+
+# Enough of an error body to identify the failure without buffering all of it
+_ERROR_BODY_LIMIT = 512
+
+async def read_error_text(response: aiohttp.ClientResponse) -> str:
+    """
+    Read a bounded prefix of an error response body and release the connection.
+    Args:
+        response: Response with an unexpected status
+    Returns:
+        At most _ERROR_BODY_LIMIT bytes of the body, decoded leniently
+    """
+    try:
+        body = await response.content.read(_ERROR_BODY_LIMIT)
+        return body.decode('utf-8', 'replace')
+    finally:
+        response.release()
+
+# Process-wide session so every component shares one connection pool
+_session: Optional[aiohttp.ClientSession] = None
+
+async def get_session(timeout: aiohttp.ClientTimeout, limit: int = 0) -> aiohttp.ClientSession:
+    """
+    Return the process-wide session, creating it on first use.
+    Args:
+        timeout: Default timeout, applied only when the session is created
+        limit: Maximum number of open connections, applied only on creation
+    Returns:
+        The shared ClientSession
+    """
+    global _session
+    if _session is None or _session.closed:
+        _session = await create_session(timeout, limit)
+    return _session
+
+async def close_session() -> None:
+    """Close the process-wide session; call once at shutdown"""
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
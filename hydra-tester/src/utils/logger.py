@@ -1,10 +1,22 @@
 import logging
 import sys
-import threading
+import orjson
 from rich.console import Console
 from rich.logging import RichHandler
 from typing import Optional, Any
-from queue import Queue
+from queue import SimpleQueue
+from logging.handlers import QueueHandler, QueueListener
+
+class _LocalQueueHandler(QueueHandler):
+    """QueueHandler for an in-process listener.
+
+    The stock prepare() formats each record in the calling thread so it can be
+    pickled; records here never leave the process, so they are queued as-is and
+    all formatting happens on the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
 
 class ThreadSafeLogger:
     """Thread-safe logger with rich formatting and file output support"""
@@ -16,8 +28,7 @@ class ThreadSafeLogger:
         log_file: Optional[str] = None,
         verbose: bool = False
     ):
-        self._queue = Queue()
-        self._thread = threading.Thread(target=self._logger_thread, daemon=True)
+        self._queue = SimpleQueue()
         # Set up rich console
         self.console = Console()
         
@@ -28,9 +39,6 @@ class ThreadSafeLogger:
         # Clear any existing handlers
         self.logger.handlers = []
         
-        # Start logger thread
-        self._thread.start()
-        
         # Create console handler with rich formatting
         console_handler = RichHandler(
             console=self.console,
@@ -40,37 +48,34 @@ class ThreadSafeLogger:
             rich_tracebacks=True
         )
         console_handler.setLevel(logging.DEBUG if verbose else logging.INFO)
-        self.logger.addHandler(console_handler)
+        console_handler.setFormatter(logging.Formatter('[Thread-%(thread)d] %(message)s'))
+        handlers = [console_handler]
         
         # Add file handler if log_file is specified
         if log_file:
             file_handler = logging.FileHandler(log_file)
             file_handler.setLevel(logging.DEBUG)
             formatter = logging.Formatter(
-                '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+                '%(asctime)s - %(name)s - %(levelname)s - [Thread-%(thread)d] %(message)s'
             )
             file_handler.setFormatter(formatter)
-            self.logger.addHandler(file_handler)
-
-    def _logger_thread(self):
-        """Background thread for processing log messages"""
-        while True:
-            record = self._queue.get()
-            if record is None:
-                break
-            # Process the log record
-            self.logger.handle(record)
-            
-    def _enqueue(self, level: int, msg: str, *args, **kwargs):
-        """Add log record to queue"""
-        thread_id = threading.get_ident()
-        msg = f"[Thread-{thread_id}] {msg}"
-        record = logging.LogRecord(
-            "hydra-tester", level, "", 0, msg, args, None
-        )
-        self._queue.put(record)
+            handlers.append(file_handler)
+
+        # Callers only enqueue records; the listener thread formats and emits them
+        self.logger.addHandler(_LocalQueueHandler(self._queue))
+        self._listener = QueueListener(self._queue, *handlers, respect_handler_level=True)
+        self._listener.start()
+
+    def isEnabledFor(self, level: int) -> bool:
+        """Check whether messages at this level would be emitted"""
+        return self.logger.isEnabledFor(level)
+
+    def _log(self, level: int, msg: str, args: tuple, kwargs: dict):
+        """Log through the stdlib logger, attributing the record to our caller"""
+        kwargs.setdefault("stacklevel", 3)
+        self.logger.log(level, msg, *args, **kwargs)
 
-    def debug(self, msg: str, data: Any = None, *args, **kwargs):
+    def debug(self, msg: str, *args, data: Any = None, **kwargs):
         """Log debug message with optional data"""
         if data is not None:
             if isinstance(data, dict):
@@ -78,39 +83,40 @@ class ThreadSafeLogger:
                 self.console.print_json(data=data)
             else:
                 self.console.print(f"\n[dim]Debug data:[/dim] {data}")
-        self._enqueue(logging.DEBUG, msg, *args, **kwargs)
+        self._log(logging.DEBUG, msg, args, kwargs)
 
     def info(self, msg: str, *args, **kwargs):
         """Log info message"""
-        self._enqueue(logging.INFO, msg, *args, **kwargs)
+        self._log(logging.INFO, msg, args, kwargs)
 
     def warning(self, msg: str, *args, **kwargs):
         """Log warning message"""
-        self._enqueue(logging.WARNING, msg, *args, **kwargs)
+        self._log(logging.WARNING, msg, args, kwargs)
 
     def error(self, msg: str, *args, **kwargs):
         """Log error message"""
-        self._enqueue(logging.ERROR, msg, *args, **kwargs)
+        self._log(logging.ERROR, msg, args, kwargs)
 
     def critical(self, msg: str, *args, **kwargs):
         """Log critical message"""
-        self._enqueue(logging.CRITICAL, msg, *args, **kwargs)
+        self._log(logging.CRITICAL, msg, args, kwargs)
 
     def exception(self, msg: str, *args, **kwargs):
         """Log exception with traceback"""
-        self._enqueue(logging.ERROR, msg, *args, exc_info=True, **kwargs)
+        kwargs.setdefault("exc_info", True)
+        self._log(logging.ERROR, msg, args, kwargs)
 
-    def section(self, title: str):
+    def section(self, title: str, **kwargs):
         """Log a section header"""
-        self._enqueue(logging.INFO, f"\n{'='*20} {title} {'='*20}\n")
+        self._log(logging.INFO, f"\n{'='*20} {title} {'='*20}\n", (), kwargs)
 
-    def success(self, msg: str):
+    def success(self, msg: str, **kwargs):
         """Log a success message"""
-        self._enqueue(logging.INFO, f"✓ {msg}")
+        self._log(logging.INFO, f"✓ {msg}", (), kwargs)
 
-    def failure(self, msg: str):
+    def failure(self, msg: str, **kwargs):
         """Log a failure message"""
-        self._enqueue(logging.ERROR, f"✗ {msg}")
+        self._log(logging.ERROR, f"✗ {msg}", (), kwargs)
 
     def json(self, data: Any, title: Optional[str] = None):
         """Log data with optional title"""
@@ -118,26 +124,69 @@ class ThreadSafeLogger:
         if title:
             msg += f"\n{title}:\n"
         if isinstance(data, (dict, list)):
-            import json
-            msg += json.dumps(data, indent=2)
+            msg += orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
         else:
             msg += str(data)
-        self._enqueue(logging.INFO, msg)
+        self._log(logging.INFO, msg, (), {})
 
     def flush(self):
         """Flush all queued messages and wait for them to be processed"""
-        # Add a sentinel message to mark the end
-        self._queue.put(None)
-        # Wait for the thread to process all messages
-        if self._thread.is_alive():
-            self._thread.join()
-        # Create a new thread for future messages
-        self._thread = threading.Thread(target=self._logger_thread, daemon=True)
-        self._thread.start()
+        # stop() drains the queue and joins the listener thread; restart it
+        # for future messages
+        self._listener.stop()
+        self._listener.start()
 
     def __del__(self):
         """Cleanup on deletion"""
-        self.flush()
+        self._listener.stop()
+
+class PrefixedLogger:
+    """Adapter that prepends a fixed prefix such as "[Client X Thread Y]" to each message.
+
+    Plays the role of logging.LoggerAdapter for ThreadSafeLogger, which is not a
+    stdlib Logger. The prefix is formatted once, at construction. stacklevel=4
+    attributes each record to the adapter's caller rather than to this class.
+    """
+
+    def __init__(self, logger: ThreadSafeLogger, prefix: str):
+        self.logger = logger
+        self.prefix = f"{prefix} "
+
+    def isEnabledFor(self, level: int) -> bool:
+        """Check whether messages at this level would be emitted"""
+        return self.logger.isEnabledFor(level)
+
+    def debug(self, msg: str, *args, **kwargs):
+        """Log prefixed debug message"""
+        self.logger.debug(self.prefix + msg, *args, stacklevel=4, **kwargs)
+
+    def info(self, msg: str, *args, **kwargs):
+        """Log prefixed info message"""
+        self.logger.info(self.prefix + msg, *args, stacklevel=4, **kwargs)
+
+    def warning(self, msg: str, *args, **kwargs):
+        """Log prefixed warning message"""
+        self.logger.warning(self.prefix + msg, *args, stacklevel=4, **kwargs)
+
+    def error(self, msg: str, *args, **kwargs):
+        """Log prefixed error message"""
+        self.logger.error(self.prefix + msg, *args, stacklevel=4, **kwargs)
+
+    def exception(self, msg: str, *args, **kwargs):
+        """Log prefixed exception with traceback"""
+        self.logger.exception(self.prefix + msg, *args, stacklevel=4, **kwargs)
+
+    def success(self, msg: str):
+        """Log prefixed success message"""
+        self.logger.success(self.prefix + msg, stacklevel=4)
+
+    def failure(self, msg: str):
+        """Log prefixed failure message"""
+        self.logger.failure(self.prefix + msg, stacklevel=4)
+
+    def section(self, title: str):
+        """Log a section header (unprefixed)"""
+        self.logger.section(title, stacklevel=4)
 
 # Remove the global instance creation here
 # logger = ThreadSafeLogger() 
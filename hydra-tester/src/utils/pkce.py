@@ -11,8 +11,10 @@ def generate_code_verifier(length: int = 64) -> str:
     Returns:
         A random code verifier string
     """
-    token = secrets.token_urlsafe(length)
-    return token[:length]
+    # Draw only the random bytes needed: base64 yields 4 characters per 3 bytes
+    raw = os.urandom((length * 3 + 3) // 4)
+    token = base64.urlsafe_b64encode(raw).rstrip(b'=')
+    return token[:length].decode('ascii')
 
 def generate_code_challenge(code_verifier: str) -> str:
     """